@@ -1,6 +1,8 @@
 import streamlit as st
 import sys
 import os
+import queue
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -28,7 +30,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 # Now import modules
 try:
     from model_utils import load_model, predict_image, get_class_labels
-    from report_generator import generate_report
+    from report_generator import (
+        agenerate_report, generate_fallback_report, submit_async, show_fallback_notice, REPORT_DEADLINE
+    )
     from image_processor import preprocess_image, display_image_info
     from pdf_utils import create_pdf_report
     from ui_components import create_sidebar, display_results
@@ -37,6 +41,50 @@ except ImportError as e:
     st.error(f"Module import error: {e}")
     MODULES_LOADED = False
 
+def _report_key(prediction, confidence, patient_info):
+    """Identify the inputs a generated report depends on"""
+    return (prediction, confidence, tuple(sorted(patient_info.items())))
+
+def _prefetch_report(prediction, confidence, patient_info):
+    """Start generating the report on the background loop unless it is already current"""
+    report_key = _report_key(prediction, confidence, patient_info)
+
+    pending = st.session_state.get('report_future')
+    if pending is not None:
+        if pending[0] == report_key:
+            return
+        # Inputs changed; stop the superseded Gemini call instead of letting it spend quota
+        pending[1].cancel()
+        del st.session_state.report_future
+
+    if st.session_state.get('report_key') == report_key:
+        return
+
+    chunks = queue.Queue()
+    future = submit_async(agenerate_report(prediction, confidence, patient_info, on_chunk=chunks.put))
+    deadline = time.monotonic() + REPORT_DEADLINE
+    st.session_state.report_future = (report_key, future, chunks, deadline)
+
+def _stream_report(report_key, future, chunks, deadline):
+    """
+    Render the prefetched report as it streams in, then return (report, error)
+    Falls back to the template report if Gemini has not finished by the deadline
+    """
+    placeholder = st.empty()
+    while not future.done() or not chunks.empty():
+        if not future.done() and time.monotonic() > deadline:
+            future.cancel()
+            placeholder.empty()
+            prediction, confidence, patient_info_items = report_key
+            report = generate_fallback_report(prediction, confidence, dict(patient_info_items))
+            return report, f"Report generation timed out after {REPORT_DEADLINE} seconds"
+        try:
+            placeholder.markdown(chunks.get(timeout=0.1))
+        except queue.Empty:
+            pass
+    placeholder.empty()
+    return future.result()
+
 def main():
     st.title("🏥 AI Medical Image Analysis System")
     st.markdown("### Automated Chest X-Ray Analysis with AI-Generated Reports")
@@ -90,6 +138,9 @@ def analyze_image(image, patient_info):
             processed_image = preprocess_image(image)
             prediction, confidence, all_predictions = predict_image(model, processed_image)
 
+            # Kick off the Gemini report now so it overlaps with the chart and table rendering
+            _prefetch_report(prediction, confidence, patient_info)
+
             st.session_state.update({
                 'prediction': prediction,
                 'confidence': confidence,
@@ -109,6 +160,13 @@ def display_analysis_results():
         st.info("👆 Upload an X-ray image and click 'Analyze Image' to see results")
         return
 
+    # No-op when analyze_image already started it or the report is current
+    _prefetch_report(
+        st.session_state.prediction,
+        st.session_state.confidence,
+        st.session_state.patient_info
+    )
+
     display_results(
         st.session_state.prediction,
         st.session_state.confidence,
@@ -119,21 +177,25 @@ def display_analysis_results():
 
     with st.spinner("🤖 Generating detailed report..."):
         try:
-            report = generate_report(
-                st.session_state.prediction,
-                st.session_state.confidence,
-                st.session_state.patient_info
-            )
+            # Stream the prefetched report the first time; reruns reuse the finished text.
+            # It stays pending until complete so a rerun mid-stream picks it up again.
+            pending = st.session_state.get('report_future')
+            if pending is not None:
+                st.session_state.report, st.session_state.report_error = _stream_report(*pending)
+                st.session_state.report_key = pending[0]
+                del st.session_state.report_future
+
+            # The report was generated off the script thread, so its fallback notice is shown here
+            if st.session_state.report_error:
+                show_fallback_notice(st.session_state.report_error)
 
             st.text_area(
                 "Generated Report",
-                report,
+                st.session_state.report,
                 height=300,
                 help="AI-generated medical report based on image analysis"
             )
 
-            st.session_state.report = report
-
         except Exception as e:
             st.error(f"❌ Error generating report: {str(e)}")
             return
@@ -158,16 +220,20 @@ def display_analysis_results():
 def generate_pdf():
     try:
         with st.spinner("📄 Creating PDF report..."):
-            pdf_buffer = create_pdf_report(
-                st.session_state.image,
-                st.session_state.prediction,
-                st.session_state.confidence,
-                st.session_state.report,
-                st.session_state.patient_info,
-                st.session_state.analysis_time
-            )
-
-            st.session_state.pdf_buffer = pdf_buffer.getvalue()
+            # Render once per analysis and report; the bytes stay in this session only
+            pdf_key = (st.session_state.analysis_time, st.session_state.report)
+            if st.session_state.get('pdf_key') != pdf_key:
+                pdf_buffer = create_pdf_report(
+                    st.session_state.image,
+                    st.session_state.prediction,
+                    st.session_state.confidence,
+                    st.session_state.report,
+                    st.session_state.patient_info,
+                    st.session_state.analysis_time
+                )
+
+                st.session_state.pdf_buffer = pdf_buffer.getvalue()
+                st.session_state.pdf_key = pdf_key
             st.success("✅ PDF report generated successfully!")
 
     except Exception as e:
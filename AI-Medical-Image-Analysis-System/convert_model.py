@@ -0,0 +1,73 @@
+"""
+One-off conversion of the Keras model to an int8-quantized TFLite model
+
+Usage:
+    python convert_model.py path/to/xray_images [--samples 100]
+
+The images in the given directory are used as the representative dataset
+for post-training quantization, so they should be typical chest X-rays.
+"""
+import argparse
+import os
+import sys
+
+import tensorflow as tf
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from image_processor import preprocess_image
+from model_utils import MODEL_PATH, TFLITE_MODEL_PATH
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+def representative_dataset(image_dir, num_samples):
+    """
+    Yield preprocessed X-rays scaled to [0, 1] for calibrating the quantization ranges
+    The calibrated input range then maps to roughly scale 1/255 and zero point 0,
+    so the uint8 interpreter input stays close to the raw pixel values
+    """
+    files = sorted(
+        f for f in os.listdir(image_dir)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    )[:num_samples]
+
+    if not files:
+        raise SystemExit(f"❌ No images found in {image_dir}")
+
+    print(f"Calibrating with {len(files)} images from {image_dir}")
+
+    def generator():
+        for filename in files:
+            with Image.open(os.path.join(image_dir, filename)) as image:
+                yield [preprocess_image(image) / 255.0]
+
+    return generator
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the Keras model to int8 TFLite")
+    parser.add_argument('image_dir', help="Directory of representative chest X-ray images")
+    parser.add_argument('--samples', type=int, default=100, help="Number of calibration images")
+    args = parser.parse_args()
+
+    if not os.path.exists(MODEL_PATH):
+        raise SystemExit(f"❌ Model file not found at {MODEL_PATH}")
+
+    # Quantize the float model itself; a leading uint8->float cast is not int8-quantizable
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.representative_dataset = representative_dataset(args.image_dir, args.samples)
+
+    tflite_model = converter.convert()
+
+    with open(TFLITE_MODEL_PATH, 'wb') as f:
+        f.write(tflite_model)
+
+    print(f"✅ Wrote {TFLITE_MODEL_PATH} ({len(tflite_model) / (1024*1024):.1f} MB)")
+
+if __name__ == "__main__":
+    main()
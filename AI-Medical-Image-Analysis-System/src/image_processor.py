@@ -3,6 +3,59 @@ import numpy as np
 from PIL import Image
 import tensorflow as tf
 
+# Model input size (224x224 for MobileNetV2)
+TARGET_SIZE = (224, 224)
+
+@tf.function(input_signature=[tf.TensorSpec([None, None, 3], tf.uint8)])
+def _preprocess_fn(image):
+    """
+    Resize and batch a uint8 RGB image in a single traced graph
+    Antialiasing gives area-style averaging when downscaling large X-rays;
+    the result stays float (0-255) so the Keras model sees unrounded pixels
+    """
+    image = tf.image.resize(image, TARGET_SIZE, method='bilinear', antialias=True)
+    return tf.expand_dims(image, 0)
+
+# Validation results; validate_image returns a copy so callers cannot alter the shared dicts
+_RESULT_TOO_SMALL = {
+    'is_valid': False,
+    'message': 'Image resolution too low. Please upload a higher quality image.'
+}
+_RESULT_UPSCALED = {
+    'is_valid': True,
+    'message': 'Image will be upscaled for analysis. Consider using higher resolution images for better results.'
+}
+_RESULT_ASPECT_RATIO = {
+    'is_valid': True,
+    'message': 'Unusual aspect ratio detected. Ensure the image shows a complete chest X-ray.'
+}
+_RESULT_GRAYSCALE = {
+    'is_valid': True,
+    'message': 'Grayscale X-ray image detected - suitable for analysis.'
+}
+_RESULT_COLOR = {
+    'is_valid': True,
+    'message': 'Color image detected - will be processed for analysis.'
+}
+_RESULT_SUITABLE = {
+    'is_valid': True,
+    'message': 'Image appears suitable for medical analysis.'
+}
+
+# Image validation checks as (predicate(width, height, mode), result), in priority order
+_VALIDATION_RULES = [
+    # Check minimum resolution
+    (lambda w, h, mode: w < 100 or h < 100, _RESULT_TOO_SMALL),
+    # Check if image is too small
+    (lambda w, h, mode: w < 224 and h < 224, _RESULT_UPSCALED),
+    # Check aspect ratio
+    (lambda w, h, mode: not 0.5 <= w / h <= 2.0, _RESULT_ASPECT_RATIO),
+    # Check if image is grayscale (common for X-rays)
+    (lambda w, h, mode: mode == 'L', _RESULT_GRAYSCALE),
+    # Check if image is RGB
+    (lambda w, h, mode: mode == 'RGB', _RESULT_COLOR),
+]
+
 def preprocess_image(image):
     """
     Preprocess image for model prediction
@@ -11,25 +64,16 @@ def preprocess_image(image):
         image: PIL Image object
     
     Returns:
-        numpy array: Preprocessed image ready for model
+        numpy array: float32 image batch of shape (1, 224, 224, 3) in the 0-255 range
     """
     try:
-        # Resize image to model input size (224x224 for MobileNetV2)
-        target_size = (224, 224)
-        image_resized = image.resize(target_size, Image.Resampling.LANCZOS)
-        
         # Convert to RGB if needed
-        if image_resized.mode != 'RGB':
-            image_resized = image_resized.convert('RGB')
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
         
-        # Convert to numpy array
-        img_array = tf.keras.preprocessing.image.img_to_array(image_resized)
-        
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        # Normalize pixel values to [0, 1] range
-        img_array = img_array / 255.0
+        # Resize and add the batch dimension in one TF graph; the model itself
+        # rescales the pixels (see model_utils.build_end_to_end_model)
+        img_array = _preprocess_fn(np.asarray(image, dtype=np.uint8)).numpy()
         
         return img_array
         
@@ -47,8 +91,9 @@ def display_image_info(uploaded_file):
         PIL Image: Opened image object
     """
     try:
-        # Open image
+        # Open image and decode it once so display and preprocessing share the pixels
         image = Image.open(uploaded_file)
+        image.load()
         
         # Display image
         st.image(
@@ -96,47 +141,14 @@ def validate_image(image):
     """
     try:
         width, height = image.size
+        mode = image.mode
         
-        # Check minimum resolution
-        if width < 100 or height < 100:
-            return {
-                'is_valid': False,
-                'message': 'Image resolution too low. Please upload a higher quality image.'
-            }
-        
-        # Check if image is too small
-        if width < 224 and height < 224:
-            return {
-                'is_valid': True,
-                'message': 'Image will be upscaled for analysis. Consider using higher resolution images for better results.'
-            }
-        
-        # Check aspect ratio
-        aspect_ratio = width / height
-        if aspect_ratio < 0.5 or aspect_ratio > 2.0:
-            return {
-                'is_valid': True,
-                'message': 'Unusual aspect ratio detected. Ensure the image shows a complete chest X-ray.'
-            }
+        # Return the first rule that matches
+        for predicate, result in _VALIDATION_RULES:
+            if predicate(width, height, mode):
+                return dict(result)
         
-        # Check if image is grayscale (common for X-rays)
-        if image.mode == 'L':
-            return {
-                'is_valid': True,
-                'message': 'Grayscale X-ray image detected - suitable for analysis.'
-            }
-        
-        # Check if image is RGB
-        if image.mode == 'RGB':
-            return {
-                'is_valid': True,
-                'message': 'Color image detected - will be processed for analysis.'
-            }
-        
-        return {
-            'is_valid': True,
-            'message': 'Image appears suitable for medical analysis.'
-        }
+        return dict(_RESULT_SUITABLE)
         
     except Exception as e:
         return {
@@ -2,35 +2,100 @@ import tensorflow as tf
 import numpy as np
 import streamlit as st
 import os
+import threading
 
 # Class labels from your COVID-19 dataset
 CLASS_LABELS = ['COVID', 'Lung_Opacity', 'Normal', 'Viral Pneumonia']
 
-# Model file path
+# Model file paths (the int8 TFLite model is preferred; see convert_model.py)
 MODEL_PATH = 'models/medical_model.h5'
+TFLITE_MODEL_PATH = 'models/medical_model.tflite'
+
+# TFLite interpreters are not thread-safe and the cached one is shared across sessions
+_TFLITE_LOCK = threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def _load_tflite_interpreter():
+    """
+    Create the quantized TFLite interpreter once per process
+    Raises on failure so that errors are not cached
+    """
+    interpreter = tf.lite.Interpreter(
+        model_path=TFLITE_MODEL_PATH,
+        num_threads=os.cpu_count()
+    )
+    interpreter.allocate_tensors()
+    _check_tflite_input(interpreter.get_input_details()[0])
+    _warm_up(interpreter)
+    return interpreter
+
+@st.cache_resource(show_spinner=False)
+def _load_keras_model():
+    """
+    Deserialize the trained CNN model once per process
+    Raises on failure so that errors are not cached
+    """
+    model = build_end_to_end_model(tf.keras.models.load_model(MODEL_PATH))
+    _warm_up(model)
+    return model
+
+def build_end_to_end_model(model):
+    """
+    Wrap a model trained on [0, 1] inputs so it accepts 0-255 pixel values
+    The /255 rescale then runs inside the TF graph instead of in numpy
+    
+    Args:
+        model: Keras model expecting normalized 224x224x3 float inputs
+    
+    Returns:
+        Keras model taking float batches of shape (N, 224, 224, 3) in the 0-255 range
+    """
+    inputs = tf.keras.Input(shape=(224, 224, 3), dtype='float32')
+    x = tf.keras.layers.Rescaling(1.0 / 255)(inputs)
+    return tf.keras.Model(inputs, model(x))
+
+def _unwrap_model(model):
+    """Return the trained network inside a build_end_to_end_model wrapper, or model itself"""
+    layers = model.layers
+    if len(layers) == 3 and isinstance(layers[1], tf.keras.layers.Rescaling) and isinstance(layers[2], tf.keras.Model):
+        return layers[2]
+    return model
+
+def _warm_up(model):
+    """
+    Run one dummy forward pass so graph tracing and kernel setup
+    happen at load time instead of on the first user request
+    """
+    try:
+        dummy_input = np.zeros((1, 224, 224, 3), dtype=np.float32)
+        if isinstance(model, tf.lite.Interpreter):
+            _predict_tflite(model, dummy_input)
+        else:
+            model.predict(dummy_input, verbose=0)
+    except Exception:
+        # A failed warm-up only means the first real prediction is slower
+        pass
 
 def load_model():
     """
     Load the trained CNN model
-    Returns the loaded model or None if loading fails
+    Returns a TFLite interpreter when the converted model is available,
+    otherwise the Keras model, or None if loading fails
     """
     try:
+        if os.path.exists(TFLITE_MODEL_PATH):
+            try:
+                return _load_tflite_interpreter()
+            except Exception as e:
+                st.warning(f"⚠️ Could not load TFLite model, falling back to Keras: {str(e)}")
+        
         if not os.path.exists(MODEL_PATH):
             st.warning(f"⚠️ Model file not found at {MODEL_PATH}")
             st.info("Please upload your trained model file to the 'models/' directory")
             return None
         
-        # Load the model
-        model = tf.keras.models.load_model(MODEL_PATH)
-        
-        # Verify model architecture
-        input_shape = model.input_shape
-        output_shape = model.output_shape
-        
-        st.success(f"✅ Model loaded successfully!")
-        st.info(f"📊 Model Info: Input shape: {input_shape}, Output classes: {output_shape[1]}")
-        
-        return model
+        # Load the Keras model (cached across Streamlit reruns)
+        return _load_keras_model()
         
     except Exception as e:
         st.error(f"❌ Error loading model: {str(e)}")
@@ -41,51 +106,113 @@ def predict_image(model, processed_image):
     Make prediction on preprocessed image
     
     Args:
-        model: Loaded Keras model
-        processed_image: Preprocessed image array
+        model: Loaded TFLite interpreter or Keras model
+        processed_image: Resized 0-255 float image batch from preprocess_image
     
     Returns:
         tuple: (predicted_class, confidence, all_predictions)
     """
     try:
         # Make prediction
-        predictions = model.predict(processed_image, verbose=0)
+        if isinstance(model, tf.lite.Interpreter):
+            predictions = _predict_tflite(model, processed_image)
+        else:
+            predictions = model.predict(processed_image, verbose=0)
+        
+        # Convert all probabilities to Python floats in one pass
+        probs = predictions[0].tolist()
         
         # Get the predicted class
-        predicted_class_idx = np.argmax(predictions[0])
+        predicted_class_idx = int(np.argmax(predictions[0]))
         predicted_class = CLASS_LABELS[predicted_class_idx]
-        confidence = predictions[0][predicted_class_idx]
+        confidence = probs[predicted_class_idx]
         
         # Create dictionary of all predictions for display
-        all_predictions = {
-            CLASS_LABELS[i]: float(predictions[0][i]) 
-            for i in range(len(CLASS_LABELS))
-        }
+        all_predictions = dict(zip(CLASS_LABELS, probs))
         
-        return predicted_class, float(confidence), all_predictions
+        return predicted_class, confidence, all_predictions
         
     except Exception as e:
         raise Exception(f"Prediction failed: {str(e)}")
 
+def _predict_tflite(interpreter, processed_image):
+    """Run a single forward pass through the TFLite interpreter"""
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    
+    _check_tflite_input(input_details)
+    
+    # Quantize the 0-255 pixels with the input parameters calibrated by
+    # convert_model.py (close to scale 1/255 and zero point 0)
+    scale, zero_point = input_details['quantization']
+    input_data = np.clip(
+        np.round(processed_image / 255.0 / scale + zero_point), 0, 255
+    ).astype(np.uint8)
+    
+    with _TFLITE_LOCK:
+        interpreter.set_tensor(input_details['index'], input_data)
+        interpreter.invoke()
+        predictions = interpreter.get_tensor(output_details['index'])
+    
+    # Dequantize integer outputs back to probabilities
+    if output_details['dtype'] != np.float32:
+        scale, zero_point = output_details['quantization']
+        predictions = (predictions.astype(np.float32) - zero_point) * scale
+    
+    return predictions
+
+def _check_tflite_input(input_details):
+    """
+    Refuse interpreters without a quantized uint8 input, e.g. an older float32 model
+    Casting the 0-255 pixels to float would silently feed it unnormalized values
+    """
+    if input_details['dtype'] != np.uint8:
+        raise Exception(
+            f"{TFLITE_MODEL_PATH} expects {np.dtype(input_details['dtype']).name} input; "
+            "regenerate it with convert_model.py"
+        )
+
 def get_class_labels():
     """Return the class labels"""
     return CLASS_LABELS
 
-def get_model_info():
+def get_model_info(model=None):
     """
     Get information about the loaded model
-    Returns dictionary with model details
+    
+    Args:
+        model: Already loaded model; loaded from cache if not given
+    
+    Returns:
+        dict: Model details, or None if no model is available
     """
     try:
-        model = load_model()
+        if model is None:
+            model = load_model()
         if model is None:
             return None
         
+        if isinstance(model, tf.lite.Interpreter):
+            return {
+                'input_shape': tuple(model.get_input_details()[0]['shape']),
+                'output_shape': tuple(model.get_output_details()[0]['shape']),
+                'tensors': len(model.get_tensor_details())
+            }
+        
+        # Describe the trained network rather than the rescaling wrapper around it
+        model = _unwrap_model(model)
+        
+        # Counting trainable params walks every weight tensor, so do it once per model
+        if not hasattr(model, '_cached_trainable_params'):
+            model._cached_trainable_params = sum(
+                tf.keras.backend.count_params(w) for w in model.trainable_weights
+            )
+        
         return {
             'input_shape': model.input_shape,
             'output_shape': model.output_shape,
             'total_params': model.count_params(),
-            'trainable_params': sum([tf.keras.backend.count_params(w) for w in model.trainable_weights]),
+            'trainable_params': model._cached_trainable_params,
             'layers': len(model.layers)
         }
         
@@ -6,8 +6,36 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
 from reportlab.lib.units import inch
 import io
+import re
+import textwrap
 import streamlit as st
 from datetime import datetime
+from PIL import Image
+
+# Largest image dimension embedded in PDFs (display slots are at most 4 inches)
+PDF_IMAGE_MAX_SIZE = (400, 400)
+
+# Markdown-style bold (**text**) in generated reports
+_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+
+def _encode_pdf_image(image):
+    """
+    Downscale image to display resolution and encode it as JPEG
+    
+    Args:
+        image: PIL Image object
+    
+    Returns:
+        tuple: (BytesIO JPEG buffer, (width, height) of the encoded image)
+    """
+    thumb = image.copy()
+    thumb.thumbnail(PDF_IMAGE_MAX_SIZE, Image.Resampling.BILINEAR)
+    
+    img_buffer = io.BytesIO()
+    thumb.convert('RGB').save(img_buffer, format='JPEG', quality=85, optimize=False)
+    img_buffer.seek(0)
+    
+    return img_buffer, thumb.size
 
 def create_pdf_report(image, prediction, confidence, report_text, patient_info, analysis_time):
     """
@@ -50,6 +78,19 @@ def create_pdf_report(image, prediction, confidence, report_text, patient_info,
             spaceAfter=10
         )
         
+        # Report body styles carry their own trailing space instead of separate Spacers
+        report_header_style = ParagraphStyle(
+            'ReportHeader',
+            parent=header_style,
+            spaceAfter=20
+        )
+        
+        body_style = ParagraphStyle(
+            'Body',
+            parent=styles['Normal'],
+            spaceAfter=10
+        )
+        
         # Title
         story.append(Paragraph("MEDICAL IMAGE ANALYSIS REPORT", title_style))
         story.append(Spacer(1, 20))
@@ -107,17 +148,15 @@ def create_pdf_report(image, prediction, confidence, report_text, patient_info,
             story.append(Paragraph("CHEST X-RAY IMAGE", header_style))
             
             # Convert PIL image to ReportLab image
-            img_buffer = io.BytesIO()
-            image.save(img_buffer, format='PNG')
-            img_buffer.seek(0)
+            img_buffer, (img_width, img_height) = _encode_pdf_image(image)
             
             # Scale image to fit page
-            img_width, img_height = image.size
             max_width, max_height = 4*inch, 4*inch
             scale = min(max_width/img_width, max_height/img_height)
             scaled_width = img_width * scale
             scaled_height = img_height * scale
             
+            # RLImage wraps the buffer in a single ImageReader and embeds the JPEG stream as-is
             rl_image = RLImage(img_buffer, width=scaled_width, height=scaled_height)
             story.append(rl_image)
             story.append(Spacer(1, 20))
@@ -125,22 +164,16 @@ def create_pdf_report(image, prediction, confidence, report_text, patient_info,
         # Medical report
         story.append(Paragraph("DETAILED MEDICAL REPORT", header_style))
         
-        # Process text to replace Markdown-style bold (**text**) with HTML-style bold (<b>text</b>)
-        def process_text(text):
-            import re
-            return re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
-
-        # Update report paragraphs to use processed text
-        report_paragraphs = [process_text(para) for para in report_text.split('\n\n')]
+        # Replace Markdown-style bold (**text**) with HTML-style bold (<b>text</b>)
+        report_paragraphs = [_BOLD_RE.sub(r'<b>\1</b>', para) for para in report_text.split('\n\n')]
 
         for para in report_paragraphs:
             if para.strip():
                 # Check if it's a section header (all caps)
                 if para.strip().isupper() and len(para.strip()) < 50:
-                    story.append(Paragraph(para.strip(), header_style))
+                    story.append(Paragraph(para.strip(), report_header_style))
                 else:
-                    story.append(Paragraph(para.strip(), styles['Normal']))
-                story.append(Spacer(1, 10))
+                    story.append(Paragraph(para.strip(), body_style))
         
         # Disclaimer
         story.append(Spacer(1, 30))
@@ -222,14 +255,11 @@ def create_simple_pdf_report(image, prediction, confidence, report_text, patient
             p.drawString(50, y_position, "CHEST X-RAY IMAGE:")
             y_position -= 30
             
-            # Add image
-            img_buffer = io.BytesIO()
-            image.save(img_buffer, format='PNG')
-            img_buffer.seek(0)
+            # Add image (one reader, created before any page break, so it can be reused)
+            img_buffer, (img_width, img_height) = _encode_pdf_image(image)
             img_reader = ImageReader(img_buffer)
             
             # Scale image
-            img_width, img_height = image.size
             max_width, max_height = 200, 200
             scale = min(max_width/img_width, max_height/img_height)
             scaled_width = img_width * scale
@@ -254,19 +284,12 @@ def create_simple_pdf_report(image, prediction, confidence, report_text, patient
             
             # Handle long lines
             if len(line) > 80:
-                words = line.split(' ')
-                current_line = ""
-                for word in words:
-                    if len(current_line + word) < 80:
-                        current_line += word + " "
-                    else:
-                        if current_line:
-                            p.drawString(50, y_position, current_line.strip())
-                            y_position -= 12
-                        current_line = word + " "
-                if current_line:
-                    p.drawString(50, y_position, current_line.strip())
+                for wrapped in textwrap.wrap(line, width=80, break_long_words=False):
+                    p.drawString(50, y_position, wrapped)
                     y_position -= 12
+                    if y_position < 50:
+                        p.showPage()
+                        y_position = height - 50
             else:
                 p.drawString(50, y_position, line)
                 y_position -= 12
@@ -1,10 +1,285 @@
 import streamlit as st
 import os
-from datetime import datetime
+import time
+import asyncio
+import json
+import sqlite3
+import hashlib
+import string
+import re
+import functools
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+
+# Generated reports are cached in process memory. They contain age, gender and
+# clinical history, so they are only written to disk when REPORT_CACHE_DB names
+# a database file to persist them in.
+REPORT_CACHE_PATH = os.getenv("REPORT_CACHE_DB")
+REPORT_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+REPORT_CACHE_MAX_ENTRIES = 256
+
+# Semantic cache of reports for similarly worded clinical histories
+# (opt-in: it reuses another patient's report text; needs sentence-transformers and faiss-cpu)
+USE_SEMANTIC_CACHE = os.getenv("SEMANTIC_REPORT_CACHE") == "1"
+SEMANTIC_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'med_report_semantic')
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+# Per-request timeout for Gemini calls; the app also stops waiting for a report after REPORT_DEADLINE
+GEMINI_REQUEST_TIMEOUT = 60  # seconds
+REPORT_DEADLINE = 90  # seconds, from when the report is requested
+
+# Explicit Gemini context caching of the static prompt prefix (opt-in, billed storage)
+USE_GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE") == "1"
+GEMINI_CONTEXT_CACHE_TTL = timedelta(hours=1)
+
+# Gemini model for reports. Thinking tokens count toward max_output_tokens and
+# google-generativeai 0.8.x cannot set a thinking budget, so a model that does
+# not think by default is used and the whole budget goes to the report text.
+GEMINI_MODEL = 'gemini-2.5-flash-lite'
+
+# Output token budget per prediction (a Normal report is much shorter);
+# a report that still hits its budget is rejected, never cached
+_MAX_TOKENS = {"Normal": 400, "COVID": 900, "Viral Pneumonia": 800, "Lung_Opacity": 900}
+
+# Identifying patient fields that must never be persisted in the cache
+_PII_FIELDS = ('Patient ID', 'Referring Physician')
+
+# The only free-text patient field; the semantic cache embeds it and matches
+# every other field (Age, Gender) exactly
+_FREE_TEXT_FIELD = 'Clinical History'
+
+# Sentence embeddings barely separate "fever" from "no fever", so the
+# negation words present in the history are matched exactly as well
+_NEGATION_WORDS = frozenset({'no', 'not', 'denies', 'denied', 'without', 'negative', 'absent', 'never'})
+
+# In-memory report cache: key -> (report, timestamp), oldest first
+_MEMORY_CACHE = {}
+_MEMORY_CACHE_LOCK = threading.Lock()
+
+# In-process FAISS indexes per (prediction, confidence bucket, structured fields) partition
+_SEMANTIC_INDEXES = {}
+_SEMANTIC_LOCK = threading.Lock()
+
+# The one background event loop for async Gemini calls, created on first use
+_EVENT_LOOP_STATE = {'loop': None}
+_EVENT_LOOP_LOCK = threading.Lock()
+
+# Model bound to the current explicit context cache and when to recreate (or retry creating) it
+_PREFIX_CACHE_STATE = {'model': None, 'refresh_at': 0.0}
+_PREFIX_CACHE_LOCK = threading.Lock()
+
+def _has_pii(patient_info):
+    """Check whether patient_info contains identifying fields"""
+    return bool(patient_info) and any(patient_info.get(field) for field in _PII_FIELDS)
+
+def build_cache_key(prediction, confidence, patient_info):
+    """Build an exact-match cache key; confidence is bucketed to 2 decimals"""
+    payload = {
+        'prediction': prediction,
+        'conf_bucket': round(confidence, 2),
+        'patient': patient_info or {}
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def _open_report_cache():
+    """Open the report cache database, creating it if needed"""
+    cache_dir = os.path.dirname(REPORT_CACHE_PATH)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(REPORT_CACHE_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS reports (key TEXT PRIMARY KEY, report TEXT, ts REAL)")
+    return conn
+
+def _cache_get(key):
+    """Return the cached report for key, or None if missing or expired"""
+    if REPORT_CACHE_PATH:
+        with closing(_open_report_cache()) as conn:
+            row = conn.execute("SELECT report, ts FROM reports WHERE key = ?", (key,)).fetchone()
+    else:
+        with _MEMORY_CACHE_LOCK:
+            row = _MEMORY_CACHE.get(key)
+    if row and time.time() - row[1] < REPORT_CACHE_TTL:
+        return row[0]
+    return None
+
+def _cache_put(key, report):
+    """Store a generated report under key"""
+    if not REPORT_CACHE_PATH:
+        with _MEMORY_CACHE_LOCK:
+            _MEMORY_CACHE.pop(key, None)
+            _MEMORY_CACHE[key] = (report, time.time())
+            # Evict the oldest entries beyond the size limit
+            while len(_MEMORY_CACHE) > REPORT_CACHE_MAX_ENTRIES:
+                del _MEMORY_CACHE[next(iter(_MEMORY_CACHE))]
+        return
+    
+    with closing(_open_report_cache()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO reports (key, report, ts) VALUES (?, ?, ?)",
+            (key, report, time.time())
+        )
+
+def _exact_cache_lookup(prediction, confidence, patient_info):
+    """Return (key, cached report); key is None when the cache must be bypassed"""
+    if _has_pii(patient_info):
+        return None, None
+    
+    key = build_cache_key(prediction, confidence, patient_info)
+    try:
+        return key, _cache_get(key)
+    except (sqlite3.Error, OSError):
+        # The cache is an optimization only (and HOME may be unwritable);
+        # never fail a report because of it
+        return key, None
+
+def _exact_cache_store(key, report):
+    """Store report under key unless the cache was bypassed"""
+    if key is None:
+        return
+    try:
+        _cache_put(key, report)
+    except (sqlite3.Error, OSError):
+        pass
+
+def cached_call(func):
+    """
+    Cache async report generation by (prediction, confidence bucket, patient_info)
+    Calls with identifying patient fields bypass the cache entirely;
+    extra keyword arguments are passed through and not part of the key
+    """
+    @functools.wraps(func)
+    async def wrapper(prediction, confidence, patient_info=None, **kwargs):
+        # SQLite I/O runs in a worker thread so the shared loop is never blocked
+        key, report = await asyncio.to_thread(_exact_cache_lookup, prediction, confidence, patient_info)
+        if report is None:
+            report = await func(prediction, confidence, patient_info, **kwargs)
+            await asyncio.to_thread(_exact_cache_store, key, report)
+        return report
+    
+    return wrapper
+
+@functools.lru_cache(maxsize=1)
+def _get_embedder():
+    """Load the sentence embedding model once per process"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(SEMANTIC_EMBEDDING_MODEL)
+
+def _embed(text):
+    """Embed text as a normalized float32 row vector for inner-product search"""
+    return _get_embedder().encode([text], normalize_embeddings=True).astype('float32')
+
+def _get_semantic_index(partition):
+    """Return the (FAISS index, reports) pair for a partition, loading it from disk if present"""
+    import faiss
+    
+    if partition not in _SEMANTIC_INDEXES:
+        base_path = os.path.join(SEMANTIC_CACHE_DIR, partition)
+        if os.path.exists(base_path + '.faiss'):
+            index = faiss.read_index(base_path + '.faiss')
+            with open(base_path + '.json') as f:
+                reports = json.load(f)
+        else:
+            index = faiss.IndexFlatIP(_get_embedder().get_sentence_embedding_dimension())
+            reports = []
+        _SEMANTIC_INDEXES[partition] = (index, reports)
+    
+    return _SEMANTIC_INDEXES[partition]
+
+def _save_semantic_index(partition, index, reports):
+    """Persist a partition's FAISS index and reports"""
+    import faiss
+    
+    os.makedirs(SEMANTIC_CACHE_DIR, exist_ok=True)
+    base_path = os.path.join(SEMANTIC_CACHE_DIR, partition)
+    faiss.write_index(index, base_path + '.faiss')
+    with open(base_path + '.json', 'w') as f:
+        json.dump(reports, f)
+
+def _semantic_partition(prediction, confidence, patient_info):
+    """
+    Return the semantic cache partition for a request, or None to bypass the layer
+    Everything except the free-text history (and its negation words) must match exactly
+    """
+    patient_info = patient_info or {}
+    history = patient_info.get(_FREE_TEXT_FIELD)
+    
+    # Without free text there is nothing to match loosely; the exact cache covers it
+    if not USE_SEMANTIC_CACHE or _has_pii(patient_info) or not history:
+        return None
+    
+    structured = {k: v for k, v in patient_info.items() if k != _FREE_TEXT_FIELD}
+    structured['negations'] = sorted(_NEGATION_WORDS.intersection(re.findall(r"[a-z]+", history.lower())))
+    return build_cache_key(prediction, confidence, structured)
+
+def _semantic_cache_lookup(prediction, confidence, patient_info):
+    """
+    Return (partition, query embedding, cached report)
+    The embedding is None when the layer is bypassed or unavailable
+    """
+    partition = _semantic_partition(prediction, confidence, patient_info)
+    if partition is None:
+        return None, None, None
+    
+    try:
+        query = _embed(patient_info[_FREE_TEXT_FIELD])
+        with _SEMANTIC_LOCK:
+            index, reports = _get_semantic_index(partition)
+            if index.ntotal:
+                scores, ids = index.search(query, 1)
+                if scores[0][0] >= SEMANTIC_CACHE_THRESHOLD:
+                    return partition, query, reports[ids[0][0]]
+    except Exception:
+        # Optional dependencies missing or cache unreadable; skip this layer
+        return partition, None, None
+    
+    return partition, query, None
+
+def _semantic_cache_store(partition, query, report):
+    """Add report to the partition's index unless the layer was bypassed"""
+    if query is None:
+        return
+    try:
+        with _SEMANTIC_LOCK:
+            index, reports = _get_semantic_index(partition)
+            index.add(query)
+            reports.append(report)
+            _save_semantic_index(partition, index, reports)
+    except Exception:
+        pass
+
+def semantic_cached_call(func):
+    """
+    Reuse a prior report when the clinical history is semantically similar
+    
+    Off unless SEMANTIC_REPORT_CACHE=1. A hit returns a report generated for a
+    different patient whose history only embeds close to this one, so details
+    such as laterality, duration or qualifiers in the narrative may be wrong
+    for this patient, and that patient's free text is shown in this record.
+    
+    Matches are only looked up among reports for the same prediction,
+    confidence bucket, structured patient fields (age, gender) and negation
+    words. Calls without a clinical history skip this layer, as does
+    everything when sentence-transformers or faiss is not installed.
+    """
+    @functools.wraps(func)
+    async def wrapper(prediction, confidence, patient_info=None, **kwargs):
+        # Model loading, encoding and index I/O run in a worker thread
+        partition, query, report = await asyncio.to_thread(
+            _semantic_cache_lookup, prediction, confidence, patient_info
+        )
+        if report is None:
+            report = await func(prediction, confidence, patient_info, **kwargs)
+            await asyncio.to_thread(_semantic_cache_store, partition, query, report)
+        return report
+    
+    return wrapper
 
 def generate_report(prediction, confidence, patient_info=None):
     """
-    Generate detailed medical report using Gemini 2.5 Flash
+    Generate detailed medical report using Gemini 2.5 Flash-Lite
+    Blocks until the report is ready; the app prefetches via agenerate_report instead
     
     Args:
         prediction: Predicted disease class
@@ -14,68 +289,231 @@ def generate_report(prediction, confidence, patient_info=None):
     Returns:
         str: Generated medical report
     """
+    report, error = run_async(agenerate_report(prediction, confidence, patient_info))
+    if error:
+        show_fallback_notice(error)
+    return report
+
+async def agenerate_report(prediction, confidence, patient_info=None, on_chunk=None):
+    """
+    Async variant of generate_report that does not block while Gemini responds
+    
+    This runs on the background loop thread, where Streamlit elements cannot be
+    rendered, so a Gemini failure is returned for the caller to display instead
+    
+    Args:
+        prediction: Predicted disease class
+        confidence: Confidence score
+        patient_info: Optional patient information dictionary
+        on_chunk: Optional thread-safe callable receiving the report text so far as it streams
+    
+    Returns:
+        tuple: (report, error) where error is None unless the template fallback was used
+    """
     try:
-        # Try Gemini first
-        return generate_gemini_report(prediction, confidence, patient_info)
+        return await agenerate_gemini_report(prediction, confidence, patient_info, on_chunk=on_chunk), None
     except Exception as e:
-        st.warning(f"⚠️ Gemini API unavailable: {str(e)}")
-        st.info("🔄 Falling back to enhanced template-based report...")
-        return generate_fallback_report(prediction, confidence, patient_info)
+        return generate_fallback_report(prediction, confidence, patient_info), str(e)
+
+def show_fallback_notice(error):
+    """Tell the user the report came from the template fallback"""
+    st.warning(f"⚠️ Gemini API unavailable: {error}")
+    st.info("🔄 Falling back to enhanced template-based report...")
+
+def _get_event_loop():
+    """
+    Start one background event loop per process for the async Gemini calls
+    The SDK's async client binds to the loop it was first used on, so all
+    coroutines run on this loop rather than on a new asyncio.run() loop each time;
+    the lock keeps concurrent first calls from different sessions creating two loops
+    """
+    with _EVENT_LOOP_LOCK:
+        if _EVENT_LOOP_STATE['loop'] is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="gemini-async", daemon=True).start()
+            _EVENT_LOOP_STATE['loop'] = loop
+        return _EVENT_LOOP_STATE['loop']
+
+def submit_async(coro):
+    """Schedule coro on the background loop and return a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+
+def run_async(coro):
+    """Run coro on the background loop and wait for its result"""
+    return submit_async(coro).result()
+
+async def agenerate_many(cases):
+    """
+    Generate several reports concurrently
+    
+    Args:
+        cases: Iterable of dicts with prediction, confidence and optional patient_info
+    
+    Returns:
+        list: (report, error) tuples in the same order as cases
+    """
+    return await asyncio.gather(*(agenerate_report(**case) for case in cases))
+
+@functools.lru_cache(maxsize=1)
+def _get_genai():
+    """
+    Import and configure the Gemini SDK once per process
+    Failures (missing package or API key) raise and are retried on the next call
+    """
+    import google.generativeai as genai
+
+    # Get API key from secrets or environment
+    # For Streamlit deployment, it's best to use st.secrets
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise Exception("Google API key not found. Set it in your environment.")
+    
+    # Configure Gemini
+    genai.configure(api_key=api_key)
+    return genai
+
+@functools.lru_cache(maxsize=1)
+def _get_model():
+    """
+    Create the Gemini model client once per process
+    Its async client comes from the SDK's per-process client manager,
+    so every report and connection test shares the same channel; async calls
+    all run on the one background loop so the async channel stays usable
+    """
+    return _get_genai().GenerativeModel(GEMINI_MODEL)
+
+@functools.lru_cache(maxsize=1)
+def _get_safety_settings():
+    """Build the safety settings once; the SDK types are only importable lazily"""
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+    
+    # --- SOLUTION: ADJUST SAFETY SETTINGS ---
+    # This tells the model not to block content for these categories.
+    # Use with caution and only in controlled applications.
+    return {
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    }
+
+def _prepare_gemini_request(prediction, confidence, patient_info):
+    """
+    Build the Gemini model and request arguments for a report request
+    
+    Returns:
+        tuple: (model, prompt, request kwargs)
+    """
+    genai = _get_genai()
+    
+    # Build patient context
+    patient_context = build_patient_context(patient_info)
+    
+    # With an explicit context cache only the case section is sent;
+    # otherwise the full prompt still benefits from implicit prefix caching
+    model = _get_prefix_cached_model(genai) if USE_GEMINI_CONTEXT_CACHE else None
+    if model is not None:
+        prompt = create_case_section(prediction, confidence, patient_context)
+    else:
+        model = _get_model()
+        prompt = create_gemini_prompt(prediction, confidence, patient_context)
+    
+    request_kwargs = {
+        'generation_config': genai.types.GenerationConfig(
+            temperature=0.2,
+            max_output_tokens=_MAX_TOKENS.get(prediction, 1000),
+            top_p=0.8
+        ),
+        'safety_settings': _get_safety_settings(),
+        'request_options': {'timeout': GEMINI_REQUEST_TIMEOUT}
+    }
+    
+    return model, prompt, request_kwargs
+
+def _get_prefix_cached_model(genai):
+    """
+    Return a GenerativeModel bound to a CachedContent holding the static prompt prefix, or None
+    The cache and model are recreated shortly before the TTL expires; if creation fails
+    (e.g. the prefix is below the minimum cacheable size) it is retried after one TTL
+    """
+    with _PREFIX_CACHE_LOCK:
+        now = time.time()
+        if now < _PREFIX_CACHE_STATE['refresh_at']:
+            return _PREFIX_CACHE_STATE['model']
+        
+        ttl_seconds = GEMINI_CONTEXT_CACHE_TTL.total_seconds()
+        try:
+            prefix_cache = genai.caching.CachedContent.create(
+                model=f'models/{GEMINI_MODEL}',
+                contents=[_STATIC_PREFIX],
+                ttl=GEMINI_CONTEXT_CACHE_TTL
+            )
+            _PREFIX_CACHE_STATE['model'] = genai.GenerativeModel.from_cached_content(prefix_cache)
+            _PREFIX_CACHE_STATE['refresh_at'] = now + ttl_seconds - 60
+        except Exception:
+            _PREFIX_CACHE_STATE['model'] = None
+            _PREFIX_CACHE_STATE['refresh_at'] = now + ttl_seconds
+        
+        return _PREFIX_CACHE_STATE['model']
+
+def _check_not_truncated(response):
+    """Raise if the report hit the output token limit, so a cut-off report is never cached"""
+    if response.candidates and response.candidates[0].finish_reason.name == 'MAX_TOKENS':
+        raise Exception("Gemini stopped at the output token limit; the report is incomplete.")
+
+def _extract_report_text(response):
+    """Return the report text, raising if Gemini returned no or truncated content"""
+    _check_not_truncated(response)
+    
+    # --- ENHANCED DEBUGGING ---
+    # Instead of failing on response.text, check the parts first
+    if response.parts:
+        return response.text
+    else:
+        # If there are no parts, the model still refused to answer.
+        # Include the prompt feedback in the error to understand why;
+        # the caller shows it (this may run off the script thread).
+        finish_reason = response.candidates[0].finish_reason if response.candidates else None
+        raise Exception(
+            "Content generation failed despite safety overrides. Check the prompt or model configuration. "
+            f"Finish Reason: {finish_reason}. Prompt Feedback: {response.prompt_feedback}"
+        )
 
-def generate_gemini_report(prediction, confidence, patient_info=None):
-    """Generate report using Gemini 2.5 Flash"""
+@cached_call
+@semantic_cached_call
+async def agenerate_gemini_report(prediction, confidence, patient_info=None, on_chunk=None):
+    """
+    Generate report using Gemini 2.5 Flash-Lite without blocking the event loop
+    The text so far is passed to on_chunk as it streams; cache hits return without calling it
+    
+    Returns:
+        str: The complete report text
+    """
     
     try:
-        import google.generativeai as genai
-        from google.generativeai.types import HarmCategory, HarmBlockThreshold
-
-        # Get API key from secrets or environment
-        # For Streamlit deployment, it's best to use st.secrets
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise Exception("Google API key not found. Set it in your environment.")
+        # SDK import/configuration and CachedContent.create are blocking calls
+        model, prompt, request_kwargs = await asyncio.to_thread(
+            _prepare_gemini_request, prediction, confidence, patient_info
+        )
         
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        # Generate report incrementally
+        response = await model.generate_content_async(prompt, stream=True, **request_kwargs)
         
-        # Build patient context
-        patient_context = build_patient_context(patient_info)
+        report = ""
+        async for chunk in response:
+            if chunk.parts:
+                report += chunk.text
+                if on_chunk is not None:
+                    on_chunk(report)
         
-        # Create comprehensive prompt
-        prompt = create_gemini_prompt(prediction, confidence, patient_context)
+        if not report:
+            # Nothing was streamed; report why via the non-streaming checks
+            return _extract_report_text(response)
         
-        # --- SOLUTION: ADJUST SAFETY SETTINGS ---
-        # This tells the model not to block content for these categories.
-        # Use with caution and only in controlled applications.
-        safety_settings = {
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        }
-
-        # Generate report
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.2,
-                max_output_tokens=1000,
-                top_p=0.8
-            ),
-            safety_settings=safety_settings  # <-- Add this line
-        )
+        # The last chunk carries the finish reason for the whole stream
+        _check_not_truncated(response)
         
-        # --- ENHANCED DEBUGGING ---
-        # Instead of failing on response.text, check the parts first
-        if response.parts:
-            return response.text
-        else:
-            # If there are no parts, the model still refused to answer.
-            # Print the prompt feedback to understand why.
-            st.error(f"Gemini did not return content. Finish Reason: {response.candidates[0].finish_reason}")
-            st.error(f"Prompt Feedback: {response.prompt_feedback}")
-            raise Exception("Content generation failed despite safety overrides. Check the prompt or model configuration.")
+        return report
 
     except ImportError:
         raise Exception("'google-generativeai' package not installed. Please run 'pip install google-generativeai'")
@@ -83,25 +521,102 @@ def generate_gemini_report(prediction, confidence, patient_info=None):
         # Pass a more informative error message up
         raise Exception(f"An error occurred with the Gemini API: {str(e)}")
 
-def create_gemini_prompt(prediction, confidence, patient_context):
-    """Create a re-engineered, safer prompt for Gemini."""
-    
-    condition_guidance = get_condition_guidance(prediction)
-    
-    # Re-framed prompt to be a co-pilot, not the primary diagnostician.
-    prompt = f"""
+# Condition-specific guidance for report generation
+_CONDITION_GUIDANCE = {
+    'COVID': {
+        'findings': """
+        Describe bilateral ground-glass opacities with peripheral and lower lobe distribution.
+        Mention the typical appearance of COVID-19 pneumonia.
+        Note any associated findings like air bronchograms or consolidation.
+        Comment on cardiac silhouette and pleural spaces.
+        """,
+        'impression': """
+        State findings consistent with COVID-19 pneumonia.
+        Mention the bilateral peripheral pattern typical of viral pneumonia.
+        """,
+        'recommendations': """
+        Include RT-PCR testing confirmation, isolation protocols,
+        clinical correlation with symptoms, follow-up imaging timeline,
+        and consideration of chest CT if clinically indicated.
+        """
+    },
+
+    'Viral Pneumonia': {
+        'findings': """
+        Describe bilateral interstitial or mixed alveolar-interstitial infiltrates.
+        Note the diffuse distribution pattern typical of viral etiology.
+        Differentiate from bacterial pneumonia appearance.
+        Comment on any associated findings.
+        """,
+        'impression': """
+        State findings consistent with viral pneumonia.
+        Note the bilateral interstitial pattern.
+        """,
+        'recommendations': """
+        Include supportive care measures, symptom monitoring,
+        follow-up imaging schedule, clinical evaluation,
+        and consideration of antiviral therapy if specific virus identified.
+        """
+    },
+
+    'Lung_Opacity': {
+        'findings': """
+        Describe the location, extent, and characteristics of the opacities.
+        Consider differential diagnosis including infection, inflammation, or fluid.
+        Note any associated findings like air bronchograms or volume loss.
+        Comment on distribution pattern.
+        """,
+        'impression': """
+        State presence of lung opacities with differential diagnosis.
+        Mention need for clinical correlation.
+        """,
+        'recommendations': """
+        Include clinical correlation with symptoms and vital signs,
+        laboratory studies (CBC, inflammatory markers),
+        consideration of chest CT for better characterization,
+        and appropriate follow-up imaging timeline.
+        """
+    },
+
+    'Normal': {
+        'findings': """
+        Confirm clear lung fields bilaterally with no consolidation.
+        Note normal cardiac silhouette and mediastinal contours.
+        Comment on normal diaphragmatic contours and costophrenic angles.
+        State no acute abnormalities are present.
+        """,
+        'impression': """
+        State normal chest radiograph with no acute cardiopulmonary abnormalities.
+        """,
+        'recommendations': """
+        Include routine follow-up as clinically appropriate,
+        continued clinical monitoring if symptomatic,
+        no immediate imaging follow-up required,
+        and age-appropriate screening recommendations.
+        """
+    }
+}
+
+def _format_guidance_table():
+    """Render every condition's guidance as one static lookup table for the prompt"""
+    sections = []
+    for condition, guidance in _CONDITION_GUIDANCE.items():
+        sections.append(
+            f"Condition: {condition}\n"
+            f"Guidance for Findings: {guidance['findings']}\n"
+            f"Guidance for Impression: {guidance['impression']}\n"
+            f"Guidance for Recommendations: {guidance['recommendations']}"
+        )
+    return "\n\n".join(sections)
+
+# Prompt content identical across calls. It is kept as one contiguous prefix,
+# with all case-specific data appended after it, so provider prefix caching can match.
+_STATIC_PREFIX = f"""
     You are an expert assistant for a radiologist, skilled at structuring AI-driven analysis into a professional report format.
 
-    An AI image analysis model has processed a chest X-ray and provided the following preliminary result:
-    
-    {patient_context}
-    
-    AI ANALYSIS RESULTS:
-    - Predicted Condition: {prediction}
-    - AI Confidence Level: {confidence:.1%}
-    - Analysis Date: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    An AI image analysis model has processed a chest X-ray. Its preliminary result and the patient information are given in the CASE section at the end.
     
-    Based on the predicted condition '{prediction}', please draft a radiology report using the following guidance and structure. You are to format the information professionally, not to make a diagnosis.
+    Based on the predicted condition, please draft a radiology report using the guidance for that condition and the structure below. You are to format the information professionally, not to make a diagnosis. Do not include a date; the analysis date is recorded separately.
 
     REPORT STRUCTURE TO FOLLOW:
     
@@ -112,130 +627,67 @@ def create_gemini_prompt(prediction, confidence, patient_context):
     TECHNIQUE: Standard chest radiography.
     
     FINDINGS: 
-    [Using the guidance below, describe the typical radiological findings for '{prediction}'.]
-    Guidance for Findings: {condition_guidance['findings']}
+    [Using the guidance for the predicted condition, describe its typical radiological findings.]
     
     IMPRESSION: 
-    [Using the guidance below, write a concise summary for '{prediction}'.]
-    Guidance for Impression: {condition_guidance['impression']}
+    [Using the guidance for the predicted condition, write a concise summary.]
     
     RECOMMENDATIONS: 
-    [Using the guidance below, provide a numbered list of appropriate recommendations for '{prediction}'.]
-    Guidance for Recommendations: {condition_guidance['recommendations']}
+    [Using the guidance for the predicted condition, provide a numbered list of appropriate recommendations.]
     
     DISCLAIMER: This report was generated with the assistance of an AI model and should be reviewed and validated by a qualified radiologist before being used for clinical decision-making.
-    """
+
+    GUIDANCE BY CONDITION:
+
+{_format_guidance_table()}
+"""
+
+def create_gemini_prompt(prediction, confidence, patient_context):
+    """Create a re-engineered, safer prompt for Gemini (static prefix + case section)"""
+    return _STATIC_PREFIX + create_case_section(prediction, confidence, patient_context)
+
+def create_case_section(prediction, confidence, patient_context):
+    """Create the case-specific part of the prompt that follows the static prefix"""
+    guidance_condition = prediction if prediction in _CONDITION_GUIDANCE else 'Normal'
+    
+    return f"""
+    CASE:
     
-    return prompt
+    AI ANALYSIS RESULTS:
+    - Predicted Condition: {prediction}
+    - Use the guidance for: {guidance_condition}
+    - AI Confidence Level: {confidence:.1%}
+    
+    {patient_context}
+    """
 
 def get_condition_guidance(prediction):
     """Get condition-specific guidance for report generation"""
-    
-    guidance = {
-        'COVID': {
-            'findings': """
-            Describe bilateral ground-glass opacities with peripheral and lower lobe distribution.
-            Mention the typical appearance of COVID-19 pneumonia.
-            Note any associated findings like air bronchograms or consolidation.
-            Comment on cardiac silhouette and pleural spaces.
-            """,
-            'impression': """
-            State findings consistent with COVID-19 pneumonia.
-            Mention the bilateral peripheral pattern typical of viral pneumonia.
-            """,
-            'recommendations': """
-            Include RT-PCR testing confirmation, isolation protocols,
-            clinical correlation with symptoms, follow-up imaging timeline,
-            and consideration of chest CT if clinically indicated.
-            """
-        },
-        
-        'Viral Pneumonia': {
-            'findings': """
-            Describe bilateral interstitial or mixed alveolar-interstitial infiltrates.
-            Note the diffuse distribution pattern typical of viral etiology.
-            Differentiate from bacterial pneumonia appearance.
-            Comment on any associated findings.
-            """,
-            'impression': """
-            State findings consistent with viral pneumonia.
-            Note the bilateral interstitial pattern.
-            """,
-            'recommendations': """
-            Include supportive care measures, symptom monitoring,
-            follow-up imaging schedule, clinical evaluation,
-            and consideration of antiviral therapy if specific virus identified.
-            """
-        },
-        
-        'Lung_Opacity': {
-            'findings': """
-            Describe the location, extent, and characteristics of the opacities.
-            Consider differential diagnosis including infection, inflammation, or fluid.
-            Note any associated findings like air bronchograms or volume loss.
-            Comment on distribution pattern.
-            """,
-            'impression': """
-            State presence of lung opacities with differential diagnosis.
-            Mention need for clinical correlation.
-            """,
-            'recommendations': """
-            Include clinical correlation with symptoms and vital signs,
-            laboratory studies (CBC, inflammatory markers),
-            consideration of chest CT for better characterization,
-            and appropriate follow-up imaging timeline.
-            """
-        },
-        
-        'Normal': {
-            'findings': """
-            Confirm clear lung fields bilaterally with no consolidation.
-            Note normal cardiac silhouette and mediastinal contours.
-            Comment on normal diaphragmatic contours and costophrenic angles.
-            State no acute abnormalities are present.
-            """,
-            'impression': """
-            State normal chest radiograph with no acute cardiopulmonary abnormalities.
-            """,
-            'recommendations': """
-            Include routine follow-up as clinically appropriate,
-            continued clinical monitoring if symptomatic,
-            no immediate imaging follow-up required,
-            and age-appropriate screening recommendations.
-            """
-        }
-    }
-    
-    return guidance.get(prediction, guidance['Normal'])
+    return _CONDITION_GUIDANCE.get(prediction, _CONDITION_GUIDANCE['Normal'])
 
 def build_patient_context(patient_info):
     """Build patient context string from provided information"""
-    if not patient_info or not any(patient_info.values()):
+    if not patient_info:
         return "PATIENT INFORMATION: Not provided"
     
-    context_parts = ["PATIENT INFORMATION:"]
-    for key, value in patient_info.items():
-        if value:
-            context_parts.append(f"- {key}: {value}")
+    # Single pass: an empty result means every field was blank
+    context_parts = [f"- {key}: {value}" for key, value in patient_info.items() if value]
+    if not context_parts:
+        return "PATIENT INFORMATION: Not provided"
     
-    return "\n".join(context_parts)
+    return "PATIENT INFORMATION:\n" + "\n".join(context_parts)
 
-def generate_fallback_report(prediction, confidence, patient_info=None):
-    """Generate enhanced template-based report when Gemini is unavailable"""
-    
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    patient_section = build_patient_context(patient_info)
-    
-    reports = {
-        'COVID': f"""CHEST X-RAY INTERPRETATION REPORT
+# Template-based reports used when Gemini is unavailable, compiled once at import
+_FALLBACK_REPORT_TEXTS = {
+    'COVID': """CHEST X-RAY INTERPRETATION REPORT
 
-{patient_section}
+$patient_section
 
 CLINICAL INDICATION: Evaluation for suspected COVID-19 pneumonia
 
 TECHNIQUE: Standard chest radiography
 
-FINDINGS: The chest radiograph demonstrates findings consistent with COVID-19 pneumonia (AI confidence: {confidence:.1%}). Bilateral ground-glass opacities are observed, predominantly in the peripheral and lower lobe distribution. The pattern is characteristic of viral pneumonia with COVID-19 features. The cardiac silhouette appears normal in size and contour. No pleural effusion or pneumothorax is identified. The mediastinal contours are unremarkable.
+FINDINGS: The chest radiograph demonstrates findings consistent with COVID-19 pneumonia (AI confidence: $confidence_pct). Bilateral ground-glass opacities are observed, predominantly in the peripheral and lower lobe distribution. The pattern is characteristic of viral pneumonia with COVID-19 features. The cardiac silhouette appears normal in size and contour. No pleural effusion or pneumothorax is identified. The mediastinal contours are unremarkable.
 
 IMPRESSION: Radiographic findings highly suggestive of COVID-19 pneumonia with bilateral peripheral ground-glass opacities.
 
@@ -246,17 +698,17 @@ RECOMMENDATIONS:
 4. Consider chest CT for better characterization if symptoms worsen
 5. Monitor oxygen saturation and respiratory status closely
 
-Report generated: {current_time}""",
+Report generated: $current_time""",
 
-        'Viral Pneumonia': f"""CHEST X-RAY INTERPRETATION REPORT
+    'Viral Pneumonia': """CHEST X-RAY INTERPRETATION REPORT
 
-{patient_section}
+$patient_section
 
 CLINICAL INDICATION: Evaluation for suspected viral pneumonia
 
 TECHNIQUE: Standard chest radiography
 
-FINDINGS: The chest radiograph shows findings consistent with viral pneumonia (AI confidence: {confidence:.1%}). Bilateral interstitial infiltrates are observed with a diffuse pattern throughout both lung fields. The appearance suggests viral etiology rather than bacterial pneumonia. The cardiac silhouette is within normal limits. No significant pleural effusion is noted.
+FINDINGS: The chest radiograph shows findings consistent with viral pneumonia (AI confidence: $confidence_pct). Bilateral interstitial infiltrates are observed with a diffuse pattern throughout both lung fields. The appearance suggests viral etiology rather than bacterial pneumonia. The cardiac silhouette is within normal limits. No significant pleural effusion is noted.
 
 IMPRESSION: Findings consistent with viral pneumonia, characterized by bilateral interstitial infiltrates.
 
@@ -267,17 +719,17 @@ RECOMMENDATIONS:
 4. Consider viral studies if specific pathogen identification needed
 5. Monitor for complications and respiratory deterioration
 
-Report generated: {current_time}""",
+Report generated: $current_time""",
 
-        'Lung_Opacity': f"""CHEST X-RAY INTERPRETATION REPORT
+    'Lung_Opacity': """CHEST X-RAY INTERPRETATION REPORT
 
-{patient_section}
+$patient_section
 
 CLINICAL INDICATION: Evaluation of lung opacities
 
 TECHNIQUE: Standard chest radiography
 
-FINDINGS: The chest radiograph reveals lung opacities (AI confidence: {confidence:.1%}). Areas of increased density are noted, suggesting possible infectious process, inflammatory changes, or fluid accumulation. The distribution and characteristics require clinical correlation for definitive diagnosis. The cardiac silhouette appears normal. Costophrenic angles are preserved.
+FINDINGS: The chest radiograph reveals lung opacities (AI confidence: $confidence_pct). Areas of increased density are noted, suggesting possible infectious process, inflammatory changes, or fluid accumulation. The distribution and characteristics require clinical correlation for definitive diagnosis. The cardiac silhouette appears normal. Costophrenic angles are preserved.
 
 IMPRESSION: Lung opacities present with differential diagnosis including pneumonia, pulmonary edema, or inflammatory process.
 
@@ -288,17 +740,17 @@ RECOMMENDATIONS:
 4. Follow-up imaging in 48-72 hours to assess response to treatment
 5. Appropriate antimicrobial therapy if infectious etiology suspected
 
-Report generated: {current_time}""",
+Report generated: $current_time""",
 
-        'Normal': f"""CHEST X-RAY INTERPRETATION REPORT
+    'Normal': """CHEST X-RAY INTERPRETATION REPORT
 
-{patient_section}
+$patient_section
 
 CLINICAL INDICATION: Routine chest evaluation
 
 TECHNIQUE: Standard chest radiography
 
-FINDINGS: The chest radiograph appears normal (AI confidence: {confidence:.1%}). The lungs are clear bilaterally with no evidence of consolidation, pneumothorax, or pleural effusion. The cardiac silhouette is normal in size and configuration. The mediastinal contours are unremarkable. The diaphragmatic contours are normal and the costophrenic angles are sharp.
+FINDINGS: The chest radiograph appears normal (AI confidence: $confidence_pct). The lungs are clear bilaterally with no evidence of consolidation, pneumothorax, or pleural effusion. The cardiac silhouette is normal in size and configuration. The mediastinal contours are unremarkable. The diaphragmatic contours are normal and the costophrenic angles are sharp.
 
 IMPRESSION: Normal chest radiograph. No acute cardiopulmonary abnormalities detected.
 
@@ -308,24 +760,36 @@ RECOMMENDATIONS:
 3. Return for imaging if respiratory symptoms develop
 4. Clinical follow-up as deemed appropriate by treating physician
 
-Report generated: {current_time}"""
-    }
-    
-    return reports.get(prediction, f"Report generation error for condition: {prediction}")
+Report generated: $current_time"""
+}
+
+_FALLBACK_TEMPLATES = {
+    condition: string.Template(text) for condition, text in _FALLBACK_REPORT_TEXTS.items()
+}
 
-def test_gemini_connection():
-    """Test Gemini API connection"""
+def generate_fallback_report(prediction, confidence, patient_info=None):
+    """Generate enhanced template-based report when Gemini is unavailable"""
+    
+    template = _FALLBACK_TEMPLATES.get(prediction)
+    if template is None:
+        return f"Report generation error for condition: {prediction}"
+    
+    return template.substitute(
+        patient_section=build_patient_context(patient_info),
+        confidence_pct=f"{confidence:.1%}",
+        current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+async def atest_gemini_connection():
+    """Test Gemini API connection without blocking the event loop"""
     try:
-        import google.generativeai as genai
-        
-        api_key = st.secrets.get("GOOGLE_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            return False, "API key not found"
+        # The first use imports and configures the SDK, which blocks
+        model = await asyncio.to_thread(_get_model)
         
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        response = model.generate_content("Test connection: respond with 'Connected'")
+        response = await model.generate_content_async(
+            "Test connection: respond with 'Connected'",
+            request_options={'timeout': GEMINI_REQUEST_TIMEOUT}
+        )
         return True, response.text
         
     except Exception as e:
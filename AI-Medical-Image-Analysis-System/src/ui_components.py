@@ -1,18 +1,10 @@
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
+import asyncio
 from model_utils import get_class_labels, get_prediction_interpretation
-from report_generator import test_gemini_connection
+from report_generator import atest_gemini_connection, run_async
 
-def setup_page_config():
-    """Configure Streamlit page settings - NOTE: Page config is now handled in main app"""
-    # Page config moved to main app.py to avoid duplicate calls
-    pass
-    # Add custom CSS styling
-    add_custom_css()
-def add_custom_css():
-    """Add custom CSS styling"""
-    st.markdown("""
+# Custom CSS injected by add_custom_css
+_CSS_STR = """
     <style>
     .main-header {
         text-align: center;
@@ -46,7 +38,17 @@ def add_custom_css():
         margin: 0.5rem 0;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+def setup_page_config():
+    """Configure Streamlit page settings - NOTE: Page config is now handled in main app"""
+    # Page config moved to main app.py to avoid duplicate calls
+    pass
+    # Add custom CSS styling
+    add_custom_css()
+def add_custom_css():
+    """Add custom CSS styling"""
+    st.markdown(_CSS_STR, unsafe_allow_html=True)
 
 def create_sidebar():
     """Create sidebar with patient information and system status"""
@@ -122,24 +124,34 @@ def create_sidebar():
     
     return patient_info
 
+async def _run_system_probes():
+    """Run the Gemini and PDF probes concurrently; a failing probe does not cancel the other"""
+    from pdf_utils import validate_pdf_generation
+    
+    results = await asyncio.gather(
+        atest_gemini_connection(),
+        asyncio.to_thread(validate_pdf_generation),
+        return_exceptions=True
+    )
+    return [(False, str(r)) if isinstance(r, Exception) else r for r in results]
+
 def test_system_connections():
     """Test system components and display status"""
     st.write("**Testing system components...**")
     
+    with st.spinner("Testing Gemini API and PDF generation..."):
+        (gemini_success, gemini_msg), (pdf_success, pdf_msg) = run_async(_run_system_probes())
+    
     # Test Gemini connection
-    with st.spinner("Testing Gemini API..."):
-        gemini_success, gemini_msg = test_gemini_connection()
-        if gemini_success:
-            st.success(f"✅ Gemini API: Connected")
-        else:
-            st.warning(f"⚠️ Gemini API: {gemini_msg}")
+    if gemini_success:
+        st.success(f"✅ Gemini API: Connected")
+    else:
+        st.warning(f"⚠️ Gemini API: {gemini_msg}")
     
     # Test model loading (placeholder)
     st.info("ℹ️ Model: Ready (add model file to test)")
     
     # Test PDF generation
-    from pdf_utils import validate_pdf_generation
-    pdf_success, pdf_msg = validate_pdf_generation()
     if pdf_success:
         st.success("✅ PDF Generation: Working")
     else:
@@ -197,12 +209,25 @@ def display_results(prediction, confidence, all_predictions):
 def create_confidence_chart(all_predictions):
     """Create interactive confidence chart"""
     
+    # Dicts are not hashable cache keys, so pass the predictions as a sorted tuple
+    fig = _build_confidence_fig(tuple(sorted(all_predictions.items())))
+    
+    st.plotly_chart(fig, use_container_width=True)
+
+@st.cache_data(show_spinner=False)
+def _build_confidence_fig(predictions_items):
+    """Build the confidence bar chart once per set of predictions"""
+    
+    # Imported here so plotly only loads once a chart is actually shown
+    import plotly.graph_objects as go
+    
     # Prepare data for chart
-    classes = list(all_predictions.keys())
-    confidences = list(all_predictions.values())
+    classes = [condition for condition, _ in predictions_items]
+    confidences = [confidence for _, confidence in predictions_items]
     
     # Create color map
-    colors = ['#FF6B6B' if pred == max(confidences) else '#4ECDC4' for pred in confidences]
+    top_confidence = max(confidences)
+    colors = ['#FF6B6B' if pred == top_confidence else '#4ECDC4' for pred in confidences]
     
     # Create bar chart
     fig = go.Figure(data=[
@@ -224,7 +249,7 @@ def create_confidence_chart(all_predictions):
         showlegend=False
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 def create_prediction_table(all_predictions, top_prediction):
     """Create detailed predictions table"""
@@ -237,7 +262,7 @@ def create_prediction_table(all_predictions, top_prediction):
     for condition, confidence in sorted_predictions:
         # Add indicators
         if condition == top_prediction:
-            indicator = "🎯 **PREDICTED**"
+            indicator = "🎯 PREDICTED"
         elif confidence > 0.1:
             indicator = "⚠️ Consider"
         else:
@@ -245,30 +270,31 @@ def create_prediction_table(all_predictions, top_prediction):
         
         table_data.append({
             "Condition": condition,
-            "Confidence": f"{confidence:.1%}",
-            "Status": indicator,
-            "Bar": confidence
+            "Confidence": confidence * 100,
+            "Status": indicator
         })
     
     # Display as DataFrame with custom styling
     import pandas as pd
     df = pd.DataFrame(table_data)
     
-    # Create progress bars for confidence
+    # Render the whole breakdown as one dataframe with progress bars for confidence
     st.write("**Detailed Confidence Breakdown:**")
     
-    for _, row in df.iterrows():
-        col1, col2, col3 = st.columns([2, 1, 2])
-        
-        with col1:
-            st.write(f"**{row['Condition']}**")
-        
-        with col2:
-            st.write(row['Confidence'])
-        
-        with col3:
-            st.progress(row['Bar'])
-            st.write(row['Status'], unsafe_allow_html=True)
+    st.dataframe(
+        df,
+        column_config={
+            "Confidence": st.column_config.ProgressColumn(
+                "Confidence",
+                format="%.1f%%",
+                min_value=0,
+                max_value=100
+            ),
+            "Status": st.column_config.TextColumn("Status")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
 
 def create_medical_advice_box(prediction, confidence):
     """Create medical advice box based on prediction"""
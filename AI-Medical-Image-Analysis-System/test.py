@@ -13,39 +13,21 @@ model_path = 'models/medical_model.h5'
 if os.path.exists(model_path):
     print(f"Model file size: {os.path.getsize(model_path) / (1024*1024):.1f} MB")
     
-    # Try to load with different methods
-    print("\n🧪 Testing model loading methods...")
+    # Load once; compile=False and safe_mode=False are the most permissive options
+    print("\n🧪 Testing model loading...")
     
-    # Method 1: Standard loading
-    try:
-        model = tf.keras.models.load_model(model_path)
-        print("✅ Standard loading: SUCCESS")
-        print(f"   Input shape: {model.input_shape}")
-        print(f"   Output shape: {model.output_shape}")
-        print(f"   Total params: {model.count_params():,}")
-    except Exception as e:
-        print(f"❌ Standard loading failed: {e}")
-    
-    # Method 2: Loading with compile=False
-    try:
-        model = tf.keras.models.load_model(model_path, compile=False)
-        print("✅ Loading without compile: SUCCESS")
-        print(f"   Input shape: {model.input_shape}")
-        print(f"   Output shape: {model.output_shape}")
-    except Exception as e:
-        print(f"❌ Loading without compile failed: {e}")
-    
-    # Method 3: Loading with custom objects
     try:
         model = tf.keras.models.load_model(
-            model_path, 
-            custom_objects=None,
+            model_path,
             compile=False,
             safe_mode=False
         )
-        print("✅ Loading with safe_mode=False: SUCCESS")
+        print("✅ Model loading: SUCCESS")
+        print(f"   Input shape: {model.input_shape}")
+        print(f"   Output shape: {model.output_shape}")
+        print(f"   Total params: {model.count_params():,}")
     except Exception as e:
-        print(f"❌ Loading with safe_mode=False failed: {e}")
+        print(f"❌ Model loading failed: {e}")
 
 else:
     print("❌ Model file not found!")
@@ -72,4 +54,5 @@ else:
 print("\n🔧 Quick fixes to try:")
 print("1. pip install --upgrade tensorflow")
 print("2. Re-save your model with current TensorFlow version")
-print("3. Use compile=False when loading model")
\ No newline at end of file
+print("3. Use compile=False when loading model")
+print("4. Convert to int8 TFLite for faster inference: python convert_model.py path/to/xray_images")
\ No newline at end of file
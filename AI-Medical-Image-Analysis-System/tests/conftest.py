@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the app modules the same way app.py does
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
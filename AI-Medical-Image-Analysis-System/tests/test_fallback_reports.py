@@ -0,0 +1,36 @@
+import pytest
+
+from model_utils import CLASS_LABELS
+from report_generator import generate_fallback_report, _FALLBACK_TEMPLATES
+
+PATIENT_INFO = {
+    'Patient ID': 'P-0042',
+    'Age': 61,
+    'Gender': 'Male',
+    'Clinical History': 'Shortness of breath for one week',
+    'Referring Physician': 'Dr. Rivera'
+}
+
+@pytest.mark.parametrize('prediction', sorted(_FALLBACK_TEMPLATES))
+def test_fallback_template_renders_completely(prediction):
+    report = generate_fallback_report(prediction, 0.873, PATIENT_INFO)
+    
+    assert report.startswith("CHEST X-RAY INTERPRETATION REPORT")
+    assert '$' not in report
+    assert "87.3%" in report
+    for key, value in PATIENT_INFO.items():
+        assert f"- {key}: {value}" in report
+
+@pytest.mark.parametrize('prediction', sorted(_FALLBACK_TEMPLATES))
+def test_fallback_template_without_patient_info(prediction):
+    report = generate_fallback_report(prediction, 0.5)
+    
+    assert "PATIENT INFORMATION: Not provided" in report
+    assert '$' not in report
+
+def test_fallback_templates_cover_every_class():
+    assert set(_FALLBACK_TEMPLATES) == set(CLASS_LABELS)
+
+def test_fallback_unknown_condition():
+    assert generate_fallback_report('Tuberculosis', 0.9, PATIENT_INFO) == \
+        "Report generation error for condition: Tuberculosis"
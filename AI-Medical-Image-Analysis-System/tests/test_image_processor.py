@@ -0,0 +1,26 @@
+import pytest
+from PIL import Image
+
+import image_processor
+from image_processor import validate_image
+
+@pytest.mark.parametrize('size, mode, expected', [
+    # Earlier rules win: a tiny grayscale image is too small, not "grayscale"
+    ((80, 300), 'L', image_processor._RESULT_TOO_SMALL),
+    ((300, 99), 'RGB', image_processor._RESULT_TOO_SMALL),
+    ((150, 200), 'L', image_processor._RESULT_UPSCALED),
+    ((200, 1000), 'RGB', image_processor._RESULT_ASPECT_RATIO),
+    ((1000, 300), 'L', image_processor._RESULT_ASPECT_RATIO),
+    ((512, 512), 'L', image_processor._RESULT_GRAYSCALE),
+    ((512, 400), 'RGB', image_processor._RESULT_COLOR),
+    ((512, 512), 'RGBA', image_processor._RESULT_SUITABLE),
+])
+def test_validate_image_branches(size, mode, expected):
+    assert validate_image(Image.new(mode, size)) == expected
+
+def test_validate_image_result_is_a_copy():
+    result = validate_image(Image.new('L', (50, 50)))
+    result['is_valid'] = True
+    
+    assert validate_image(Image.new('L', (50, 50)))['is_valid'] is False
+    assert image_processor._RESULT_TOO_SMALL['is_valid'] is False
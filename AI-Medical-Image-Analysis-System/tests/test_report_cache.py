@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+import report_generator
+from report_generator import build_cache_key, cached_call, _semantic_partition, _exact_cache_lookup
+
+BASE_INFO = {
+    'Age': 54,
+    'Gender': 'Female',
+    'Clinical History': 'Fever and dry cough for three days'
+}
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    """Use an empty in-memory report cache"""
+    monkeypatch.setattr(report_generator, 'REPORT_CACHE_PATH', None)
+    monkeypatch.setattr(report_generator, '_MEMORY_CACHE', {})
+
+@pytest.fixture
+def semantic_cache_on(monkeypatch):
+    monkeypatch.setattr(report_generator, 'USE_SEMANTIC_CACHE', True)
+
+@pytest.mark.parametrize('field, value', [('Age', 55), ('Gender', 'Male'), ('Clinical History', 'No fever')])
+def test_cache_key_depends_on_patient_fields(field, value):
+    changed = {**BASE_INFO, field: value}
+    assert build_cache_key('COVID', 0.91, BASE_INFO) != build_cache_key('COVID', 0.91, changed)
+
+def test_cache_key_buckets_confidence_and_ignores_field_order():
+    reordered = dict(reversed(list(BASE_INFO.items())))
+    assert build_cache_key('COVID', 0.911, BASE_INFO) == build_cache_key('COVID', 0.909, reordered)
+
+@pytest.mark.parametrize('field, value', [('Age', 55), ('Gender', 'Male')])
+def test_semantic_partition_matches_structured_fields_exactly(semantic_cache_on, field, value):
+    changed = {**BASE_INFO, field: value}
+    assert _semantic_partition('COVID', 0.91, BASE_INFO) != _semantic_partition('COVID', 0.91, changed)
+
+def test_semantic_partition_separates_negated_history(semantic_cache_on):
+    negated = {**BASE_INFO, 'Clinical History': 'No fever, dry cough for three days'}
+    assert _semantic_partition('COVID', 0.91, BASE_INFO) != _semantic_partition('COVID', 0.91, negated)
+
+def test_semantic_partition_shared_by_reworded_history(semantic_cache_on):
+    reworded = {**BASE_INFO, 'Clinical History': 'Three days of fever with a dry cough'}
+    assert _semantic_partition('COVID', 0.91, BASE_INFO) == _semantic_partition('COVID', 0.91, reworded)
+
+@pytest.mark.parametrize('patient_info', [
+    None,
+    {'Age': 54, 'Gender': 'Female', 'Clinical History': ''},
+    {**BASE_INFO, 'Patient ID': 'P-0042'},
+    {**BASE_INFO, 'Referring Physician': 'Dr. Smith'},
+])
+def test_semantic_partition_bypassed(semantic_cache_on, patient_info):
+    assert _semantic_partition('COVID', 0.91, patient_info) is None
+
+def test_semantic_cache_off_by_default(monkeypatch):
+    monkeypatch.setattr(report_generator, 'USE_SEMANTIC_CACHE', False)
+    assert _semantic_partition('COVID', 0.91, BASE_INFO) is None
+
+@pytest.mark.parametrize('pii_field', ['Patient ID', 'Referring Physician'])
+def test_pii_bypasses_exact_cache(memory_cache, pii_field):
+    patient_info = {**BASE_INFO, pii_field: 'identifying value'}
+    assert _exact_cache_lookup('COVID', 0.91, patient_info) == (None, None)
+
+    calls = []
+
+    @cached_call
+    async def generate(prediction, confidence, patient_info=None):
+        calls.append(prediction)
+        return f"report {len(calls)}"
+
+    assert asyncio.run(generate('COVID', 0.91, patient_info)) == "report 1"
+    assert asyncio.run(generate('COVID', 0.91, patient_info)) == "report 2"
+    assert report_generator._MEMORY_CACHE == {}
+
+def test_exact_cache_reuses_report_without_pii(memory_cache):
+    calls = []
+
+    @cached_call
+    async def generate(prediction, confidence, patient_info=None):
+        calls.append(prediction)
+        return "report"
+
+    asyncio.run(generate('COVID', 0.91, BASE_INFO))
+    asyncio.run(generate('COVID', 0.91, dict(BASE_INFO)))
+    assert len(calls) == 1